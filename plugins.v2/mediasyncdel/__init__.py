@@ -1,30 +1,116 @@
 import os
+import posixpath
 import shutil
-import time
 import re
 import datetime
-import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
 from typing import List, Tuple, Dict, Any, Optional
 
+from apscheduler.schedulers import SchedulerNotRunningError
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
+from sqlalchemy import delete, func, text, update
+from sqlalchemy.orm import Session
 
 from app import schemas
-from app.chain.storage import StorageChain
 from app.chain.transfer import TransferChain
 from app.core.config import settings
 from app.core.event import eventmanager, Event
+from app.db import db_query, db_update
+from app.db.models.downloadhistory import DownloadFiles
 from app.db.models.transferhistory import TransferHistory
 from app.db.transferhistory_oper import TransferHistoryOper
-from app.db.downloadhistory_oper import DownloadHistoryOper
-from app.helper.downloader import DownloaderHelper
+from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
-from app.schemas.types import NotificationType, EventType, MediaType, MediaImageType
-from app.utils.system import SystemUtils
-from app.modules.emby import Emby
-from app.modules.jellyfin import Jellyfin
+from app.schemas.types import NotificationType, EventType, MediaType
+from app.utils.http import RequestUtils
+from app.utils.string import StringUtils
+
+# 路径斜杠统一
+_SLASH_TABLE = str.maketrans('\\', '/')
+# 连续的路径分隔符
+_MULTI_SLASH_RE = re.compile(r"/{2,}")
+
+# Emby删除媒体日志
+_EMBY_REMOVE_MARKER = "Info App: Removing item from database, Type: "
+_EMBY_REMOVE_RE = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}) Info App: Removing item from database, '
+                             r'Type: (\w+), Name: (.*), Path: (.*), Id: (\d+)', re.ASCII)
+# 从删除路径中一次提取季、集
+_SEASON_EPISODE_RE = re.compile(r"Season\s*(?P<season>\d+)|S\d+E(?P<episode>\d+)")
+# 日志时间格式，毫秒部分由微秒截取
+_LOG_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+# 日志行开头的时间
+_LOG_TIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}", re.M)
+# 首次按范围读取日志末尾的字节数，未覆盖到上次检查时间时逐步扩大
+_LOG_TAIL_SIZE = 256 * 1024
+
+# 插件历史记录保留条数
+_HISTORY_LIMIT = 500
+# 插件历史记录落盘间隔（秒）
+_HISTORY_FLUSH_INTERVAL = 30
+# 通知合并窗口（秒）
+_NOTIFY_DELAY = 5
+# Webhook删除事件合并窗口（秒）
+_WEBHOOK_DELAY = 3
+# 默认并发数
+_DEFAULT_CONCURRENCY = 8
+# 批量删除每条语句的最大参数个数，避免超出 SQLite 变量数限制
+_DB_BATCH_SIZE = 500
+
+# 日志文件的 ETag / Last-Modified，日志未变化时跳过解析，日志同步任务串行执行无需加锁
+_log_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+# 本次读取到的 ETag / Last-Modified，日志同步成功完成后才生效，失败时下次仍会重新解析日志
+_pending_log_validators: Dict[str, Optional[Tuple[Optional[str], Optional[str]]]] = {}
+
+# 转移记录查询缓存，同一季的多次删除事件共用查询结果
+_history_cache = TTLCache(maxsize=1024, ttl=30)
+_history_lock = threading.Lock()
+
+# 同步删除查询所需的转移记录索引，宿主模型已建立的 tmdbid、download_hash 等单列索引不再重复创建
+_transfer_history_indexes = {
+    "idx_transferhistory_tmdb_dest": ("tmdbid", "dest"),
+    "idx_transferhistory_tmdbid_type": ("tmdbid", "type"),
+    "idx_transferhistory_dest": ("dest",),
+}
+_indexes_ready = False
+
+# 插件重新初始化时复用的业务对象
+_shared_objects: Dict[type, Any] = {}
+
+
+def _shared(cls: type) -> Any:
+    """
+    获取模块内共享的实例，避免每次初始化插件都重新创建
+    """
+    if cls not in _shared_objects:
+        _shared_objects[cls] = cls()
+    return _shared_objects[cls]
+
+
+@lru_cache(maxsize=4096)
+def _resolve_path(media_path: str, path_pattern: Optional[re.Pattern], path_repl: Tuple[str, ...]) -> str:
+    """
+    按路径映射转换路径，映射规则作为缓存键的一部分，规则变更后自动失效，同一剧集的多次删除事件直接命中缓存
+    """
+    # 统一斜杠
+    media_path = media_path.translate(_SLASH_TABLE)
+    if not path_pattern:
+        return media_path
+    match = path_pattern.match(media_path)
+    if not match:
+        return media_path
+    new_path = path_repl[int(match.lastgroup[1:])] + media_path[match.end():]
+    # 规则本身的斜杠已在解析时处理，仅原路径中带有连续斜杠时才需合并
+    if "//" in new_path:
+        new_path = _MULTI_SLASH_RE.sub("/", new_path)
+    return new_path
 
 
 class MediaSyncDel(_PluginBase):
@@ -57,23 +143,64 @@ class MediaSyncDel(_PluginBase):
     _del_history = False
     _exclude_path = None
     _library_path = None
+    _concurrency: int = _DEFAULT_CONCURRENCY
+    # 预解析的路径映射规则：(Windows前缀小写, 前缀长度, Linux前缀)
+    _path_map: List[Tuple[str, int, str]] = []
+    # 路径映射规则编译后的正则及各分组对应的Linux前缀
+    _path_pattern: Optional[re.Pattern] = None
+    _path_repl: Tuple[str, ...] = ()
+    # 是否存在非盘符开头的映射规则（如 Linux 到 Linux 的映射）
+    _posix_rules = False
+    # 预处理的排除路径前缀（统一斜杠、小写）
+    _exclude_prefixes: Tuple[str, ...] = ()
+    # 最长排除路径前缀的长度，判断时只需处理路径开头这一段
+    _exclude_prefix_len = 0
+    # 媒体文件扩展名（小写）
+    _media_exts: frozenset = frozenset()
     _transferchain = None
     _transferhis = None
-    _downloadhis = None
-    _default_downloader = None
-    _storagechain = None
-    _downloader_helper = None
+    # 源文件及种子清理线程池
+    _io_pool: Optional[ThreadPoolExecutor] = None
+    # 待处理的种子队列及后台处理线程
+    _torrent_queue: Optional[queue.Queue] = None
+    _torrent_worker: Optional[threading.Thread] = None
+    # 内存中的插件历史记录，以 unique 为键按删除先后排列，定时写回
+    _historys: Optional[Dict[str, dict]] = None
+    _historys_dirty = False
+    _historys_lock = threading.Lock()
+    # 待合并发送的通知
+    _notify_buffer: Optional[Dict[str, Dict[str, Any]]] = None
+    _notify_lock = threading.Lock()
+    _notify_timer: Optional[threading.Timer] = None
+    # 待合并处理的Webhook删除事件，按 (tmdb_id, 季) 分组
+    _webhook_buffer: Optional[Dict[Tuple[Any, Any], List[dict]]] = None
+    _webhook_lock = threading.Lock()
+    _webhook_timer: Optional[threading.Timer] = None
+    # 日志同步任务锁
+    _log_lock = threading.Lock()
+    # 正在处理中的删除事件
+    _inflight: Optional[set] = None
+    _inflight_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
-        self._transferchain = TransferChain()
-        self._downloader_helper = DownloaderHelper()
-        self._transferhis = TransferHistoryOper()
-        self._downloadhis = DownloadHistoryOper()
-        self._storagechain = StorageChain()
+        self._transferchain = _shared(TransferChain)
+        self._transferhis = _shared(TransferHistoryOper)
+
+        # 创建查询索引
+        self.__ensure_indexes()
 
         # 停止现有任务
         self.stop_service()
 
+        # 缓冲区按实例创建，停止服务时已处理完旧数据，插件重载后不与旧实例共享
+        self._notify_buffer = {}
+        self._webhook_buffer = {}
+        self._inflight = set()
+
+        # 加载插件历史记录
+        self._historys = self.__load_history(self.get_data('history'))
+        self._historys_dirty = False
+
         # 读取配置
         if config:
             self._enabled = config.get("enabled")
@@ -84,19 +211,15 @@ class MediaSyncDel(_PluginBase):
             self._del_history = config.get("del_history")
             self._exclude_path = config.get("exclude_path")
             self._library_path = config.get("library_path")
-
-            # 获取默认下载器
             try:
-                downloader_services = self._downloader_helper.get_services()
-                for downloader_name, downloader_info in downloader_services.items():
-                    if downloader_info.config.default:
-                        self._default_downloader = downloader_name
-            except Exception:
-                self._default_downloader = settings.DEFAULT_DOWNLOADER
+                self._concurrency = max(1, int(config.get("concurrency") or _DEFAULT_CONCURRENCY))
+            except (TypeError, ValueError):
+                self._concurrency = _DEFAULT_CONCURRENCY
 
             # 清理插件历史
             if self._del_history:
                 self.del_data(key="history")
+                self._historys = {}
                 self.update_config({
                     "enabled": self._enabled,
                     "sync_type": self._sync_type,
@@ -105,9 +228,35 @@ class MediaSyncDel(_PluginBase):
                     "del_source": self._del_source,
                     "del_history": False,
                     "exclude_path": self._exclude_path,
-                    "library_path": self._library_path
+                    "library_path": self._library_path,
+                    "concurrency": self._concurrency
                 })
 
+            # 定时写回插件历史记录
+            if self._enabled:
+                self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+                self._scheduler.add_job(func=self.__flush_history, trigger="interval",
+                                        seconds=_HISTORY_FLUSH_INTERVAL, name="媒体库同步删除历史记录写回")
+                self._scheduler.start()
+
+        # 插件启用时才创建源文件清理线程池及种子处理线程
+        if self._enabled:
+            self._io_pool = ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="mediasyncdel")
+            # 种子处理放到后台线程，避免阻塞Webhook
+            self._torrent_queue = queue.Queue()
+            self._torrent_worker = threading.Thread(target=self.__torrent_worker, args=(self._torrent_queue,),
+                                                    name="mediasyncdel-torrent", daemon=True)
+            self._torrent_worker.start()
+
+        # 预解析路径映射
+        self._path_map = self.__parse_library_path(self._library_path)
+        self._path_pattern, self._path_repl = self.__compile_path_map(self._path_map)
+        self._posix_rules = any(not self.__is_drive_path(win_prefix_lower) for win_prefix_lower, _, _ in self._path_map)
+        # 预处理排除路径
+        self._exclude_prefixes = self.__parse_exclude_path(self._exclude_path)
+        self._exclude_prefix_len = max(map(len, self._exclude_prefixes), default=0)
+        self._media_exts = frozenset(ext.lower() for ext in settings.RMT_MEDIAEXT)
+
     def get_state(self) -> bool:
         return self._enabled
 
@@ -125,58 +274,112 @@ class MediaSyncDel(_PluginBase):
             }
         ]
 
+    @staticmethod
+    def __parse_library_path(library_path: str) -> List[Tuple[str, int, str]]:
+        """
+        解析媒体库路径映射配置，支持 F:\\emby:/media/emby
+        """
+        path_map = []
+        if not library_path:
+            return path_map
+        for path in library_path.splitlines():
+            path = path.strip()
+            if not path or ":" not in path:
+                continue
+            # 从右侧切分冒号，兼容Windows盘符
+            win_prefix, linux_prefix = path.rsplit(":", 1)
+            win_prefix = win_prefix.strip().translate(_SLASH_TABLE)
+            linux_prefix = linux_prefix.strip().translate(_SLASH_TABLE).rstrip('/')
+            # Windows前缀以斜杠结尾时剩余部分不带斜杠，需由Linux前缀补齐，拼接后无需再合并重复斜杠
+            if win_prefix.endswith('/'):
+                linux_prefix += '/'
+            path_map.append((win_prefix.lower(), len(win_prefix), linux_prefix))
+        return path_map
+
+    @staticmethod
+    def __parse_exclude_path(exclude_path: str) -> Tuple[str, ...]:
+        """
+        解析排除路径配置，统一斜杠并规范化为小写前缀，末尾斜杠保留以限定目录边界
+        """
+        prefixes = []
+        for path in (exclude_path or "").split(","):
+            path = path.strip().translate(_SLASH_TABLE)
+            if not path:
+                continue
+            prefix = posixpath.normpath(path)
+            if path.endswith('/') and not prefix.endswith('/'):
+                prefix += '/'
+            prefixes.append(prefix.lower())
+        return tuple(prefixes)
+
+    @staticmethod
+    def __compile_path_map(path_map: List[Tuple[str, int, str]]) -> Tuple[Optional[re.Pattern], Tuple[str, ...]]:
+        """
+        将路径映射规则编译为单个大小写不敏感的正则，按配置顺序优先匹配
+        """
+        if not path_map:
+            return None, ()
+        pattern = re.compile("|".join(f"(?P<r{index}>{re.escape(win_prefix_lower)})"
+                                      for index, (win_prefix_lower, _, _) in enumerate(path_map)),
+                             re.IGNORECASE)
+        return pattern, tuple(linux_prefix for _, _, linux_prefix in path_map)
+
+    @staticmethod
+    def __is_drive_path(path: str) -> bool:
+        """
+        是否为 Windows 盘符开头的路径
+        """
+        return len(path) >= 2 and path[1] == ':'
+
     def _convert_path(self, media_path: str) -> str:
         """
         核心路径转换逻辑：解决 F:\ 盘符和斜杠问题
         """
         if not media_path:
             return media_path
-        
-        # 1. 统一斜杠
-        media_path = media_path.replace('\\', '/')
-        
-        if self._library_path:
-            paths = self._library_path.split("\n")
-            for path in paths:
-                path = path.strip()
-                if not path or ":" not in path:
-                    continue
-                
-                # 2. 从右侧切分冒号，支持 F:\emby:/media/emby
-                sub_paths = path.rsplit(":", 1)
-                if len(sub_paths) < 2:
-                    continue
-                
-                win_prefix = sub_paths[0].strip().replace('\\', '/')
-                linux_prefix = sub_paths[1].strip().replace('\\', '/')
-                
-                # 3. 匹配并替换
-                if media_path.lower().startswith(win_prefix.lower()):
-                    new_path = linux_prefix + media_path[len(win_prefix):]
-                    new_path = new_path.replace('//', '/')
-                    logger.info(f"路径转换成功: {media_path} -> {new_path}")
-                    return new_path
-        return media_path
+        # 无需统一斜杠，且未配置映射或不可能命中映射规则时直接返回
+        if '\\' not in media_path and (not self._path_pattern
+                                        or (not self._posix_rules and not self.__is_drive_path(media_path))):
+            return media_path
+
+        new_path = _resolve_path(media_path, self._path_pattern, self._path_repl)
+        if new_path != media_path:
+            logger.info(f"路径转换成功: {media_path} -> {new_path}")
+        return new_path
+
+    def _is_excluded(self, media_path: str) -> bool:
+        """
+        判断路径是否位于排除路径下
+        """
+        if not self._exclude_prefixes or not media_path:
+            return False
+        return media_path[:self._exclude_prefix_len].translate(_SLASH_TABLE).lower().startswith(self._exclude_prefixes)
 
     def delete_history(self, key: str, apikey: str):
         if apikey != settings.API_TOKEN:
             return schemas.Response(success=False, message="API密钥错误")
-        historys = self.get_data('history')
-        if not historys:
-            return schemas.Response(success=False, message="未找到历史记录")
-        historys = [h for h in historys if h.get("unique") != key]
-        self.save_data('history', historys)
+        with self._historys_lock:
+            if not self._historys:
+                return schemas.Response(success=False, message="未找到历史记录")
+            if self._historys.pop(key, None) is not None:
+                self._historys_dirty = True
+        # 未启用定时写回时立即保存
+        if not self._scheduler:
+            self.__flush_history()
         return schemas.Response(success=True, message="删除成功")
 
     def get_service(self) -> List[Dict[str, Any]]:
         if self._enabled and str(self._sync_type) == "log":
+            from apscheduler.triggers.cron import CronTrigger
+            # 错过的执行合并为一次，且同一时间只运行一个实例
+            job_kwargs = {"coalesce": True, "max_instances": 1, "misfire_grace_time": 60}
             if self._cron:
                 return [{
                     "id": "MediaSyncDel",
                     "name": "媒体库同步删除服务",
                     "trigger": CronTrigger.from_crontab(self._cron),
                     "func": self.sync_del_by_log,
-                    "kwargs": {}
+                    "kwargs": job_kwargs
                 }]
             else:
                 return [{
@@ -184,7 +387,7 @@ class MediaSyncDel(_PluginBase):
                     "name": "媒体库同步删除服务",
                     "trigger": "interval",
                     "func": self.sync_del_by_log,
-                    "kwargs": {"minutes": 30}
+                    "kwargs": {"minutes": 30, **job_kwargs}
                 }]
         return []
 
@@ -205,9 +408,10 @@ class MediaSyncDel(_PluginBase):
                     {
                         'component': 'VRow',
                         'content': [
-                            {'component': 'VCol', 'props': {'cols': 12, 'md': 4}, 'content': [{'component': 'VSelect', 'props': {'model': 'sync_type', 'label': '媒体库同步方式', 'items': [{'title': 'Webhook', 'value': 'webhook'}, {'title': '日志', 'value': 'log'}, {'title': 'Scripter X', 'value': 'plugin'}]}}]},
-                            {'component': 'VCol', 'props': {'cols': 12, 'md': 4}, 'content': [{'component': 'VTextField', 'props': {'model': 'cron', 'label': '日志检查周期', 'placeholder': '5位cron表达式，留空自动'}}]},
-                            {'component': 'VCol', 'props': {'cols': 12, 'md': 4}, 'content': [{'component': 'VTextField', 'props': {'model': 'exclude_path', 'label': '排除路径'}}]}
+                            {'component': 'VCol', 'props': {'cols': 12, 'md': 3}, 'content': [{'component': 'VSelect', 'props': {'model': 'sync_type', 'label': '媒体库同步方式', 'items': [{'title': 'Webhook', 'value': 'webhook'}, {'title': '日志', 'value': 'log'}, {'title': 'Scripter X', 'value': 'plugin'}]}}]},
+                            {'component': 'VCol', 'props': {'cols': 12, 'md': 3}, 'content': [{'component': 'VTextField', 'props': {'model': 'cron', 'label': '日志检查周期', 'placeholder': '5位cron表达式，留空自动'}}]},
+                            {'component': 'VCol', 'props': {'cols': 12, 'md': 3}, 'content': [{'component': 'VTextField', 'props': {'model': 'exclude_path', 'label': '排除路径'}}]},
+                            {'component': 'VCol', 'props': {'cols': 12, 'md': 3}, 'content': [{'component': 'VTextField', 'props': {'model': 'concurrency', 'label': '并发数', 'type': 'number', 'placeholder': '源文件及种子并发处理数，默认8'}}]}
                         ]
                     },
                     {'component': 'VRow', 'content': [{'component': 'VCol', 'props': {'cols': 12}, 'content': [{'component': 'VTextarea', 'props': {'model': 'library_path', 'rows': '2', 'label': '媒体库路径映射', 'placeholder': 'F:\\emby:/media/emby (支持Windows盘符)'}}]}]},
@@ -216,14 +420,15 @@ class MediaSyncDel(_PluginBase):
             }
         ], {
             "enabled": False, "notify": True, "del_source": False, "del_history": False,
-            "library_path": "", "sync_type": "webhook", "cron": "*/30 * * * *", "exclude_path": ""
+            "library_path": "", "sync_type": "webhook", "cron": "*/30 * * * *", "exclude_path": "",
+            "concurrency": _DEFAULT_CONCURRENCY
         }
 
     def get_page(self) -> List[dict]:
-        historys = self.get_data('history')
+        with self._historys_lock:
+            historys = list(reversed(self._historys.values())) if self._historys else []
         if not historys:
             return [{'component': 'div', 'text': '暂无数据', 'props': {'class': 'text-center'}}]
-        historys = sorted(historys, key=lambda x: x.get('del_time'), reverse=True)
         contents = []
         for history in historys:
             title = history.get("title")
@@ -257,20 +462,45 @@ class MediaSyncDel(_PluginBase):
         if not event_type or str(event_type) not in ['library.deleted', 'ItemDeleted']:
             return
 
+        if not event_data.item_path:
+            return
+
         # 1. 转换路径
         media_path = self._convert_path(event_data.item_path)
-        media_path = media_path.replace('\\', '/')
-        
+
         # 2. 移除 TMDB ID 强制校验
         # 即使 event_data.tmdb_id 为空，也继续执行
-        
-        self.__sync_del(media_type=event_data.media_type,
-                        media_name=event_data.item_name,
-                        media_path=media_path,
-                        tmdb_id=event_data.tmdb_id,
-                        season_num=event_data.season_id,
-                        episode_num=event_data.episode_id,
-                        delete_time=self.format_timestamp(event_data.json_object))
+
+        # 3. 删除整季时每集各触发一次事件，合并窗口内同一季的事件一起处理
+        media = {
+            "media_type": event_data.media_type,
+            "media_name": event_data.item_name,
+            "media_path": media_path,
+            "raw_path": event_data.item_path,
+            "tmdb_id": event_data.tmdb_id,
+            "season_num": event_data.season_id,
+            "episode_num": event_data.episode_id,
+            "delete_time": self.format_timestamp(event_data.json_object)
+        }
+        with self._webhook_lock:
+            self._webhook_buffer.setdefault((event_data.tmdb_id, event_data.season_id), []).append(media)
+            if not self._webhook_timer:
+                self._webhook_timer = threading.Timer(_WEBHOOK_DELAY, self.__flush_webhook)
+                self._webhook_timer.daemon = True
+                self._webhook_timer.start()
+
+    def __flush_webhook(self):
+        """
+        按分组批量处理合并窗口内的Webhook删除事件
+        """
+        with self._webhook_lock:
+            webhook_buffer, self._webhook_buffer = self._webhook_buffer, {}
+            self._webhook_timer = None
+        for medias in webhook_buffer.values():
+            try:
+                self.__sync_del_batch(medias)
+            except Exception as e:
+                logger.error(f"媒体库同步删除失败：{str(e)}")
 
     @eventmanager.register(EventType.WebhookMessage)
     def sync_del_by_plugin(self, event: Event):
@@ -282,14 +512,14 @@ class MediaSyncDel(_PluginBase):
         if not item_isvirtual or item_isvirtual == 'True': return
 
         media_path = self._convert_path(event_data.item_path)
-        media_path = media_path.replace('\\', '/')
-        
+
         self.__sync_del(media_type=event_data.item_type,
                         media_name=event_data.item_name,
                         media_path=media_path,
                         tmdb_id=event_data.tmdb_id,
                         season_num=event_data.season_id,
-                        episode_num=event_data.episode_id)
+                        episode_num=event_data.episode_id,
+                        raw_path=event_data.item_path)
 
     def __sync_del(
         self,
@@ -300,13 +530,72 @@ class MediaSyncDel(_PluginBase):
         season_num: str,
         episode_num: str,
         delete_time: Optional[str] = None,
+        raw_path: Optional[str] = None,
     ):
-        if not media_type: return
+        self.__sync_del_batch([{
+            "media_type": media_type,
+            "media_name": media_name,
+            "media_path": media_path,
+            "tmdb_id": tmdb_id,
+            "season_num": season_num,
+            "episode_num": episode_num,
+            "delete_time": delete_time,
+            "raw_path": raw_path
+        }])
+
+    def __sync_del_batch(self, medias: List[dict]):
+        """
+        批量同步删除媒体，转移记录、源文件和通知在同一批内合并处理
+        """
+        keys = []
+        pending = []
+        with self._inflight_lock:
+            for media in medias:
+                # 媒体服务器上报的原始路径仅用于排除判断
+                raw_path = media.pop("raw_path", None)
+                if not media.get("media_type"):
+                    continue
+                # 排除路径可能按媒体服务器路径或转换后的路径配置，两者均需检查，排除路径无需任何文件系统操作
+                if self._is_excluded(raw_path) or self._is_excluded(media.get("media_path")):
+                    logger.info(f"媒体路径 {raw_path or media.get('media_path')} 已被排除，暂不处理")
+                    continue
+                # 相同媒体的删除事件并发到达时只处理一次
+                key = (media.get("tmdb_id"), media.get("media_path"))
+                if key in self._inflight:
+                    logger.info(f"{media.get('media_name')} 正在同步删除中，跳过重复事件：{media.get('media_path')}")
+                    continue
+                self._inflight.add(key)
+                keys.append(key)
+                pending.append(media)
+        try:
+            matched_medias = []
+            for media in pending:
+                matched = self.__match_transfer_history(**media)
+                if matched:
+                    matched_medias.append((media, *matched))
+            if matched_medias:
+                self.__sync_del_media(matched_medias)
+        finally:
+            with self._inflight_lock:
+                self._inflight.difference_update(keys)
 
-        # 兼容重新整理
-        if Path(media_path).exists():
+    def __match_transfer_history(
+        self,
+        media_type: str,
+        media_name: str,
+        media_path: str,
+        tmdb_id: int,
+        season_num: str,
+        episode_num: str,
+        delete_time: Optional[str] = None,
+    ) -> Optional[Tuple[str, List[TransferHistory]]]:
+        """
+        查询删除路径对应的转移记录，返回 (描述, 路径匹配的记录)
+        """
+        # 兼容重新整理，lstat 不跟随软链接
+        if os.path.lexists(media_path):
             logger.warn(f"转移路径 {media_path} 依然存在，跳过处理")
-            return
+            return None
 
         # 查询转移记录
         msg, transfer_history = self.__get_transfer_his(media_type, media_name, media_path, tmdb_id, season_num, episode_num)
@@ -314,156 +603,579 @@ class MediaSyncDel(_PluginBase):
         # 【核心修复】如果 ID 查不到，强制使用路径反查
         if not transfer_history:
             logger.info(f"常规查询未找到 {media_name}，尝试路径兜底查询: {media_path}")
-            transfer_history = self._transferhis.get_by(dest=media_path)
+            transfer_history = self.__get_history(dest=media_path)
 
         if not transfer_history:
             logger.warn(f"{media_name} 未在数据库找到记录，路径：{media_path}")
-            return
+            return None
 
         if delete_time:
-            try:
-                latest_his = max(transfer_history, key=lambda x: x.date)
-                if delete_time < latest_his.date:
-                    logger.warn(f"忽略删除 {msg}，整理时间晚于删除事件")
-                    return
-            except: pass
+            # 记录已在查询缓存中，直接取最新的整理时间，无需再查库
+            latest_date = max((transferhis.date for transferhis in transfer_history if transferhis.date), default=None)
+            if latest_date and delete_time < latest_date:
+                logger.warn(f"忽略删除 {msg}，整理时间晚于删除事件")
+                return None
 
         logger.info(f"开始同步删除 {msg}, 匹配到 {len(transfer_history)} 条记录")
-        
-        del_torrent_hashs = []
-        error_cnt = 0
-        image = 'https://emby.media/notificationicon.png'
-        
-        for transferhis in transfer_history:
-            # 路径二次核对
-            if transferhis.dest != media_path:
-                logger.info(f"路径不匹配: 库中{transferhis.dest} vs 删除{media_path}")
-                continue
 
-            # 0. 删除转移记录
-            self._transferhis.delete(transferhis.id)
+        # 路径二次核对，后续批量处理只针对匹配的记录
+        matched_history = [transferhis for transferhis in transfer_history if transferhis.dest == media_path]
+        if len(matched_history) < len(transfer_history):
+            logger.info(f"{len(transfer_history) - len(matched_history)} 条记录路径与删除路径 {media_path} 不匹配，已忽略")
+        if not matched_history:
+            logger.warn(f"{msg} 没有路径匹配的转移记录，跳过处理")
+            return None
+        return msg, matched_history
+
+    def __sync_del_media(self, matched_medias: List[Tuple[dict, str, List[TransferHistory]]]):
+        """
+        删除一批媒体的转移记录、源文件，并记录通知和历史
+        """
+        matched_history = [transferhis for _, _, historys in matched_medias for transferhis in historys]
+
+        # 0. 一次性删除转移记录
+        deleted_ids = {transferhis.id for transferhis in matched_history}
+        self.__delete_transfer_history(db=None, ids=list(deleted_ids))
+        self.__evict_history(deleted_ids)
+
+        # 1. 并发删除源文件，种子交由后台线程处理
+        deleted_src_ids = set()
+        if self._del_source:
+            if self._io_pool:
+                results = list(self._io_pool.map(self.__del_source, matched_history))
+            else:
+                results = [self.__del_source(transferhis) for transferhis in matched_history]
+            # 并发删除完成后再统一清理空目录，同一目录只检查一次，避免多个线程同时遍历、删除同一目录
+            parent_paths = {src_path.parent: src_path for src_path, _ in results if src_path}
+            for src_path in parent_paths.values():
+                self.__remove_parent_dir(src_path)
+            # 通知中只统计实际删除成功的源文件
+            deleted_src_ids = {transferhis.id for transferhis, (src_path, _) in zip(matched_history, results) if src_path}
+            # 整批种子任务一次入队，由后台线程按种子和下载器合并处理
+            tasks = [task for _, task in results if task]
+            if tasks:
+                if self._torrent_queue:
+                    self._torrent_queue.put(tasks)
+                else:
+                    self.__handle_torrents(tasks)
+
+        for media, msg, historys in matched_medias:
+            logger.info(f"同步删除 {msg} 完成！")
+            if self._notify:
+                src_history = [transferhis for transferhis in historys if transferhis.src] if self._del_source else []
+                self.__add_notify(media_name=media.get("media_name"),
+                                  record_cnt=len(historys),
+                                  file_cnt=sum(1 for transferhis in src_history if transferhis.id in deleted_src_ids),
+                                  torrent_hashs={transferhis.download_hash for transferhis in src_history
+                                                 if transferhis.download_hash})
+
+        # 记录历史，同一批使用相同的删除时间，同一路径只保留最近一次
+        del_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._historys_lock:
+            for media, _, _ in matched_medias:
+                history = {
+                    "type": media.get("media_type"), "title": media.get("media_name"), "path": media.get("media_path"),
+                    "del_time": del_time
+                }
+                unique = self.__history_key(history)
+                history["unique"] = unique
+                self._historys.pop(unique, None)
+                self._historys[unique] = history
+            # 超出保留条数时移除最早的记录
+            while len(self._historys) > _HISTORY_LIMIT:
+                self._historys.pop(next(iter(self._historys)))
+            self._historys_dirty = True
+        if not self._scheduler:
+            self.__flush_history()
+
+    def __flush_history(self):
+        """
+        插件历史记录有变更时写回存储
+        """
+        with self._historys_lock:
+            if not self._historys_dirty:
+                return
+            historys = dict(self._historys)
+            self._historys_dirty = False
+        self.save_data("history", historys)
+
+    @staticmethod
+    def __history_key(history: dict) -> str:
+        """
+        插件历史记录的唯一键，沿用已有的 unique，否则取媒体路径
+        """
+        return history.get("unique") or history.get("path") or history.get("title") or ""
+
+    @classmethod
+    def __load_history(cls, historys: Any) -> Dict[str, dict]:
+        """
+        加载插件历史记录，兼容旧版按列表保存的数据
+        """
+        if not historys:
+            return {}
+        if isinstance(historys, dict):
+            return dict(historys)
+        result = {}
+        for history in sorted(historys, key=lambda x: x.get('del_time') or ''):
+            unique = cls.__history_key(history)
+            result.pop(unique, None)
+            result[unique] = dict(history, unique=unique)
+        return dict(list(result.items())[-_HISTORY_LIMIT:])
+
+    def __add_notify(self, media_name: str, record_cnt: int, file_cnt: int, torrent_hashs: set):
+        """
+        累计删除结果，合并窗口结束后每个媒体只发送一条通知
+        """
+        with self._notify_lock:
+            stat = self._notify_buffer.setdefault(media_name, {"records": 0, "files": 0, "torrents": set()})
+            stat["records"] += record_cnt
+            stat["files"] += file_cnt
+            stat["torrents"].update(torrent_hashs)
+            if not self._notify_timer:
+                self._notify_timer = threading.Timer(_NOTIFY_DELAY, self.__flush_notify)
+                self._notify_timer.daemon = True
+                self._notify_timer.start()
 
-            # 1. 删除源文件和种子
+    def __flush_notify(self):
+        """
+        发送合并后的删除通知
+        """
+        with self._notify_lock:
+            notify_buffer, self._notify_buffer = self._notify_buffer, {}
+            self._notify_timer = None
+        for media_name, stat in notify_buffer.items():
+            text = f"删除记录：{stat['records']} 条"
             if self._del_source:
-                if transferhis.src:
+                text += f"\n删除源文件：{stat['files']} 个\n处理种子：{len(stat['torrents'])} 个"
+            self.post_message(mtype=NotificationType.MediaServer,
+                              title=f"{media_name} 媒体库同步删除任务完成",
+                              text=text)
+
+    def __del_source(self, transferhis: TransferHistory) -> Tuple[Optional[Path], Optional[Tuple[str, str, str, Optional[str]]]]:
+        """
+        删除单条转移记录对应的源文件，返回 (删除成功的源文件路径, 种子处理任务)
+        """
+        if not transferhis.src:
+            return None, None
+        src_path = Path(transferhis.src)
+        deleted = False
+        try:
+            # delete_files 自身会检查文件是否存在，无需重复stat，文件不存在时返回失败
+            deleted, _ = self._transferchain.delete_files(src_path)
+        except Exception as e:
+            logger.error(f"源文件删除异常: {e}")
+
+        task = None
+        if transferhis.download_hash:
+            task = (transferhis.type, transferhis.src, transferhis.download_hash, transferhis.downloader)
+        return src_path if deleted else None, task
+
+    def __torrent_worker(self, torrent_queue: queue.Queue):
+        """
+        后台处理种子，队列中每项为一批任务，每次取出积压的全部批次合并处理
+        """
+        with ThreadPoolExecutor(max_workers=self._concurrency, thread_name_prefix="mediasyncdel-torrent") as pool:
+            while True:
+                batch = torrent_queue.get()
+                if batch is None:
+                    break
+                tasks = list(batch)
+                stop = False
+                while True:
                     try:
-                        if Path(transferhis.src).exists():
-                            self._transferchain.delete_files(Path(transferhis.src))
-                            self.__remove_parent_dir(Path(transferhis.src))
-                    except Exception as e:
-                        logger.error(f"源文件删除异常: {e}")
-
-                    if transferhis.download_hash:
-                        try:
-                            flag, success, hashes = self.handle_torrent(
-                                type=transferhis.type,
-                                src=transferhis.src,
-                                torrent_hash=transferhis.download_hash)
-                            if success and flag:
-                                del_torrent_hashs.extend(hashes)
-                            elif not success:
-                                error_cnt += 1
-                        except Exception as e:
-                            logger.error("删除种子失败：%s" % str(e))
-
-        logger.info(f"同步删除 {msg} 完成！")
-        
-        if self._notify:
-            self.post_message(mtype=NotificationType.MediaServer, title="媒体库同步删除任务完成", text=f"{msg} 已清理")
-
-        # 记录历史
-        history = self.get_data('history') or []
-        history.append({
-            "type": media_type, "title": media_name, "path": media_path,
-            "del_time": time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-        self.save_data("history", history)
+                        batch = torrent_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if batch is None:
+                        stop = True
+                        break
+                    tasks.extend(batch)
+                self.__handle_torrents(tasks, pool)
+                if stop:
+                    break
+
+    def __handle_torrents(self, tasks: List[Tuple[str, str, str, Optional[str]]],
+                          pool: Optional[ThreadPoolExecutor] = None):
+        """
+        按种子hash合并任务，不同种子并发检查，需删除的种子按下载器合并为一次调用
+        """
+        torrents: Dict[str, Tuple[Optional[str], Dict[str, None]]] = {}
+        for _, src, torrent_hash, downloader in tasks:
+            # 同一种子的源文件去重，保持原有顺序
+            torrents.setdefault(torrent_hash, (downloader, {}))[1][src] = None
+
+        def __check(item: Tuple[str, Tuple[Optional[str], Dict[str, None]]]) -> bool:
+            torrent_hash, (_, srcs) = item
+            try:
+                return self.__check_torrent(srcs=list(srcs), torrent_hash=torrent_hash)
+            except Exception as e:
+                logger.error("删除种子失败：%s" % str(e))
+                return False
+
+        items = list(torrents.items())
+        if pool and len(items) > 1:
+            results = list(pool.map(__check, items))
+        else:
+            results = [__check(item) for item in items]
+
+        remove_hashs: Dict[Optional[str], List[str]] = {}
+        for (torrent_hash, (downloader, _)), delete_flag in zip(items, results):
+            if delete_flag:
+                remove_hashs.setdefault(downloader, []).append(torrent_hash)
+        for downloader, hashs in remove_hashs.items():
+            try:
+                self.chain.remove_torrents(hashs=hashs, downloader=downloader)
+            except Exception as e:
+                logger.error("删除种子失败：%s" % str(e))
+
+    @staticmethod
+    def __ensure_indexes():
+        """
+        为转移记录表补充查询索引，每个进程只执行一次
+        """
+        global _indexes_ready
+        if _indexes_ready:
+            return
+        try:
+            MediaSyncDel.__create_indexes(db=None)
+            _indexes_ready = True
+        except Exception as e:
+            logger.error(f"创建转移记录索引失败：{str(e)}")
+
+    @staticmethod
+    @db_update
+    def __create_indexes(db: Session):
+        """
+        创建转移记录索引（已存在则跳过）
+        """
+        table = TransferHistory.__tablename__
+        for index_name, columns in _transfer_history_indexes.items():
+            db.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({', '.join(columns)})"))
+
+    @cached(cache=_history_cache, key=lambda self, **kwargs: hashkey(**kwargs), lock=_history_lock)
+    def __get_history(self, **kwargs) -> List[TransferHistory]:
+        """
+        查询转移记录，短时间内相同条件直接返回缓存
+        """
+        return self._transferhis.get_by(**kwargs) or []
+
+    @staticmethod
+    def __evict_history(ids: set):
+        """
+        从查询缓存中剔除已删除的转移记录
+        """
+        with _history_lock:
+            for transfer_history in list(_history_cache.values()):
+                transfer_history[:] = [his for his in transfer_history if his.id not in ids]
+
+    @staticmethod
+    @db_update
+    def __delete_transfer_history(db: Session, ids: List[int]):
+        """
+        按ID批量删除转移记录，分批执行并在同一事务内一次提交
+        """
+        for i in range(0, len(ids), _DB_BATCH_SIZE):
+            db.execute(delete(TransferHistory).where(TransferHistory.id.in_(ids[i:i + _DB_BATCH_SIZE])))
+
+    @staticmethod
+    @db_update
+    def __delete_download_files(db: Session, fullpaths: List[str]):
+        """
+        按完整路径批量将下载文件标记为已删除，等同于逐个调用 delete_file_by_fullpath
+        """
+        for i in range(0, len(fullpaths), _DB_BATCH_SIZE):
+            db.execute(update(DownloadFiles)
+                       .where(DownloadFiles.fullpath.in_(fullpaths[i:i + _DB_BATCH_SIZE]), DownloadFiles.state == 1)
+                       .values(state=0))
+
+    @staticmethod
+    @db_query
+    def __count_undeleted_files(db: Session, download_hash: str) -> int:
+        """
+        统计种子下仍未删除的文件数
+        """
+        return db.query(func.count(DownloadFiles.id)).filter(DownloadFiles.download_hash == download_hash,
+                                                             DownloadFiles.state == 1).scalar() or 0
 
     def __remove_parent_dir(self, file_path: Path):
-        if not SystemUtils.exits_files(file_path.parent, settings.RMT_MEDIAEXT):
-            i = 0
-            for parent_path in file_path.parents:
-                i += 1
-                if i > 3: break
-                if str(parent_path.parent) != str(file_path.root):
-                    if not SystemUtils.exits_files(parent_path, settings.RMT_MEDIAEXT):
-                        try: shutil.rmtree(parent_path)
-                        except: pass
+        """
+        向上最多三级删除不再包含媒体文件的目录，遇到仍有媒体文件的目录即停止
+        """
+        root = file_path.root
+        for parent_path in list(file_path.parents)[:3]:
+            # 不删除根目录下的一级目录
+            if str(parent_path.parent) == root:
+                break
+            # 上级目录包含当前目录，当前目录仍有媒体文件时无需继续检查
+            if self.__dir_has_media(str(parent_path)):
+                break
+            try:
+                shutil.rmtree(parent_path)
+            except OSError as e:
+                logger.debug(f"删除目录 {parent_path} 失败：{str(e)}")
+
+    def __dir_has_media(self, directory: str) -> bool:
+        """
+        递归检查目录下是否还有媒体文件，找到第一个即返回，无法读取时按有媒体文件处理
+        """
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in self._media_exts:
+                            return True
+            except FileNotFoundError:
+                # 目录本身不存在时视为无媒体文件，子目录在遍历中途消失则跳过继续检查
+                if current == directory:
+                    return False
+            except OSError:
+                return True
+        return False
 
     def __get_transfer_his(self, media_type: str, media_name: str, media_path: str, tmdb_id: int, season_num: str, episode_num: str):
         # 简化版查询，主要依赖 __sync_del 中的路径兜底
         mtype = MediaType.MOVIE if media_type in ["Movie", "MOV"] else MediaType.TV
-        if tmdb_id and str(tmdb_id).isdigit():
-            return f"{media_name}", self._transferhis.get_by(tmdbid=tmdb_id, mtype=mtype.value)
-        return f"{media_name}", []
+        if not tmdb_id or not str(tmdb_id).isdigit():
+            return f"{media_name}", []
+        if mtype == MediaType.MOVIE:
+            return f"{media_name}", self.__get_history(tmdbid=tmdb_id, mtype=mtype.value)
+        # 季集条件下推到数据库查询
+        season = self.__format_season_episode("S", season_num)
+        episode = self.__format_season_episode("E", episode_num) if season else None
+        msg = f"{media_name} {season or ''}{episode or ''}".strip()
+        if episode:
+            # 宿主按季集查询时同时匹配 dest，需带上路径，否则查不到记录
+            return msg, self.__get_history(tmdbid=tmdb_id, mtype=mtype.value, season=season, episode=episode,
+                                           dest=media_path)
+        return msg, self.__get_history(tmdbid=tmdb_id, mtype=mtype.value, season=season)
+
+    @staticmethod
+    def __format_season_episode(prefix: str, num: Any) -> Optional[str]:
+        """
+        将季集号格式化为转移记录中的 S01 / E01 格式
+        """
+        if num is None:
+            return None
+        num = str(num).strip()
+        if num.upper().startswith(prefix):
+            num = num[1:]
+        if not num.isdigit():
+            return None
+        return f"{prefix}{num.zfill(2)}"
 
     def sync_del_by_log(self):
+        # 上一次日志同步尚未结束时跳过本次
+        if not self._log_lock.acquire(blocking=False):
+            logger.info("上一次日志同步仍在进行中，跳过本次执行")
+            return
+        try:
+            self.__sync_del_by_log()
+        finally:
+            self._log_lock.release()
+
+    def __sync_del_by_log(self):
         # 日志扫描逻辑
-        history = self.get_data('history') or []
+        # 上次检查时间统一为与日志时间相同格式的字符串，便于直接比较
         last_time = self.get_data("last_time") or None
+        if isinstance(last_time, datetime.datetime):
+            last_time = last_time.strftime(_LOG_TIME_FORMAT)[:-3]
+        # 丢弃上次同步失败时遗留的暂存记录
+        _pending_log_validators.clear()
         del_medias = []
         if not settings.MEDIASERVER: return
-        for ms in settings.MEDIASERVER.split(','):
-            if ms == 'emby': del_medias.extend(self.parse_emby_log(last_time))
-            elif ms == 'jellyfin': del_medias.extend(self.parse_jellyfin_log(last_time))
+        # 仅支持解析日志的媒体服务器
+        log_parsers = {"emby": self.parse_emby_log}
+        for ms in dict.fromkeys(settings.MEDIASERVER.split(',')):
+            log_parser = log_parsers.get(ms.strip())
+            if log_parser:
+                del_medias.extend(log_parser(last_time))
 
         for del_media in del_medias:
             media_path = self._convert_path(del_media.get("path"))
             self.__sync_del(media_type=del_media.get("type"), media_name=del_media.get("name"), media_path=media_path,
-                            tmdb_id=None, season_num=del_media.get("season"), episode_num=del_media.get("episode"))
-        self.save_data("last_time", datetime.datetime.now())
-
-    def handle_torrent(self, type: str, src: str, torrent_hash: str):
-        # 完整保留原版复杂的种子处理逻辑
-        download_id = torrent_hash
-        download = self._default_downloader
-        history_key = "%s-%s" % (download, torrent_hash)
-        plugin_id = "TorrentTransfer"
-        transfer_history = self.get_data(key=history_key, plugin_id=plugin_id)
-        
-        handle_torrent_hashs = []
-        try:
-            self._downloadhis.delete_file_by_fullpath(fullpath=src)
-            download_files = self._downloadhis.get_files_by_hash(download_hash=torrent_hash)
-            
-            no_del_cnt = 0
-            if download_files:
-                for df in download_files:
-                    if df.state and int(df.state) == 1: no_del_cnt += 1
-            delete_flag = (no_del_cnt == 0)
+                            tmdb_id=None, season_num=del_media.get("season"), episode_num=del_media.get("episode"),
+                            raw_path=del_media.get("path"))
+        self.save_data("last_time", datetime.datetime.now().strftime(_LOG_TIME_FORMAT)[:-3])
+        self.__commit_log_validators()
 
-            if delete_flag:
-                logger.info(f"种子 {torrent_hash} 文件已全删，执行删除")
-                self.chain.remove_torrents(torrent_hash)
-            else:
-                logger.info(f"种子 {torrent_hash} 仍有文件，仅更新状态")
-            
-            # 简化：如果有转种记录，这里省略了复杂的递归逻辑以保证稳定性
-            # 核心删除已通过 remove_torrents 实现
-            
-            return delete_flag, True, [torrent_hash]
-        except Exception as e:
-            logger.error(f"删种失败: {str(e)}")
-            return False, False, []
+    def __check_torrent(self, srcs: List[str], torrent_hash: str) -> bool:
+        """
+        更新种子源文件的删除状态，返回种子文件是否已全部删除
+        """
+        self.__delete_download_files(db=None, fullpaths=srcs)
+        # 没有下载文件记录时同样视为已全部删除
+        delete_flag = self.__count_undeleted_files(db=None, download_hash=torrent_hash) == 0
+        if delete_flag:
+            logger.info(f"种子 {torrent_hash} 文件已全删，执行删除")
+        else:
+            logger.info(f"种子 {torrent_hash} 仍有文件，仅更新状态")
+        return delete_flag
 
     @staticmethod
     def parse_emby_log(last_time):
-        def __parse_log(file_name: str, del_list: list):
-            log_url = f"[HOST]System/Logs/{file_name}?api_key=[APIKEY]"
-            log_res = Emby().get_data(log_url)
-            if not log_res or log_res.status_code != 200: return del_list
-            pattern = r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}.\d{3}) Info App: Removing item from database, Type: (\w+), Name: (.*), Path: (.*), Id: (\d+)'
-            matches = re.findall(pattern, log_res.text)
-            for match in matches:
+        def __parse_log(host: str, apikey: str, file_name: str) -> List[dict]:
+            log_url = f"{host}System/Logs/{file_name}?api_key={apikey}"
+            log_text = MediaSyncDel.__get_log_text(log_url, last_time)
+            if not log_text: return []
+            # 只截取包含删除标记的日志行，日志按时间顺序写入，从最新的行往前读到上次检查时间即停止
+            medias = []
+            for line in MediaSyncDel.__iter_marked_lines(log_text, _EMBY_REMOVE_MARKER, reverse=True):
+                match = MediaSyncDel.__parse_emby_remove_line(line)
+                if not match:
+                    continue
                 mtime = match[0]
-                if last_time and mtime < last_time: continue
-                del_list.append({"time": mtime, "type": match[1], "name": match[2], "path": match[3], "season": None, "episode": None})
-            return del_list
-        # ... 获取日志列表逻辑 (简化) ...
-        return []
+                if last_time and mtime < last_time: break
+                mtype, path = match[1], match[3]
+                season = episode = None
+                if mtype in ("Episode", "Season"):
+                    # 单次扫描路径，各取第一个匹配的季、集
+                    for season_episode in _SEASON_EPISODE_RE.finditer(path):
+                        if season_episode["season"] and not season:
+                            season = MediaSyncDel.__format_season_episode("S", season_episode["season"])
+                        elif season_episode["episode"] and not episode and mtype == "Episode":
+                            episode = MediaSyncDel.__format_season_episode("E", season_episode["episode"])
+                medias.append({"time": mtime, "type": mtype, "name": match[2], "path": path, "id": match[4],
+                               "season": season, "episode": episode})
+            # 恢复为时间正序
+            medias.reverse()
+            return medias
+
+        emby_servers = MediaServerHelper().get_services(type_filter="emby")
+        if not emby_servers:
+            logger.error("未配置Emby媒体服务器")
+            return []
+
+        del_medias = []
+        for emby_name, emby_server in emby_servers.items():
+            emby_host = emby_server.config.config.get("host")
+            emby_apikey = emby_server.config.config.get("apikey")
+            if not emby_host or not emby_apikey:
+                continue
+            if not emby_host.endswith("/"):
+                emby_host += "/"
+            if not emby_host.startswith("http"):
+                emby_host = "http://" + emby_host
+
+            # 获取最近的日志文件列表
+            log_files = []
+            log_list_res = RequestUtils().get_res(url=f"{emby_host}System/Logs/Query?Limit=3&api_key={emby_apikey}")
+            if not log_list_res or log_list_res.status_code != 200:
+                logger.error(f"获取Emby媒体服务器 {emby_name} 日志列表出错")
+            else:
+                try:
+                    log_files = [item.get("Name") for item in log_list_res.json().get("Items") or []
+                                 if "embyserver" in (item.get("Name") or "")]
+                except (ValueError, AttributeError) as e:
+                    logger.error(f"解析Emby媒体服务器 {emby_name} 日志列表出错：{str(e)}")
+            if not log_files:
+                log_files = ["embyserver.txt"]
+
+            # 日志列表按时间倒序返回，先解析较早的日志，轮转前后的日志可能重叠，按时间和ID去重
+            seen = set()
+            for media in chain.from_iterable(__parse_log(emby_host, emby_apikey, log_file)
+                                             for log_file in reversed(log_files)):
+                key = (media["time"], media["id"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                del_medias.append(media)
+        return del_medias
+
+    @staticmethod
+    def __get_log_text(log_url: str, last_time: Optional[str]) -> Optional[str]:
+        """
+        获取日志内容，有上次检查时间时按范围只读取日志末尾，直到覆盖上次检查时间
+        """
+        # 上次读取后日志未变化时服务端返回304，无需再解析
+        headers = {}
+        etag, last_modified = _log_validators.get(log_url) or (None, None)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        tail_size = _LOG_TAIL_SIZE
+        while last_time:
+            log_res = RequestUtils(headers={**headers, "Range": f"bytes=-{tail_size}"}).get_res(url=log_url)
+            if log_res is None or log_res.status_code == 304:
+                return None
+            if log_res.status_code == 200:
+                # 服务端不支持范围请求，已返回完整日志
+                MediaSyncDel.__stage_log_validators(log_url, log_res)
+                return log_res.text
+            if log_res.status_code != 206:
+                break
+            log_text = log_res.text
+            # Content-Range: bytes 起始-结束/总长度，起始为0说明已读到日志开头
+            content_range = log_res.headers.get("Content-Range") or ""
+            if content_range.startswith("bytes 0-"):
+                MediaSyncDel.__stage_log_validators(log_url, log_res)
+                return log_text
+            # 丢弃可能不完整的第一行，最早一行日志已早于上次检查时间即可
+            log_text = log_text[log_text.find("\n") + 1:]
+            time_match = _LOG_TIME_RE.search(log_text)
+            if time_match and time_match.group() < last_time:
+                MediaSyncDel.__stage_log_validators(log_url, log_res)
+                return log_text
+            tail_size *= 4
+        log_res = RequestUtils(headers=headers).get_res(url=log_url)
+        if not log_res or log_res.status_code != 200:
+            return None
+        MediaSyncDel.__stage_log_validators(log_url, log_res)
+        return log_res.text
+
+    @staticmethod
+    def __stage_log_validators(log_url: str, log_res: Any):
+        """
+        暂存日志文件的 ETag / Last-Modified，日志同步完成后再供下次条件请求使用
+        """
+        etag, last_modified = log_res.headers.get("ETag"), log_res.headers.get("Last-Modified")
+        _pending_log_validators[log_url] = (etag, last_modified) if etag or last_modified else None
 
     @staticmethod
-    def parse_jellyfin_log(last_time): return []
+    def __commit_log_validators():
+        """
+        日志同步成功后保存暂存的 ETag / Last-Modified
+        """
+        for log_url, validators in _pending_log_validators.items():
+            if validators:
+                _log_validators[log_url] = validators
+            else:
+                _log_validators.pop(log_url, None)
+        _pending_log_validators.clear()
+
+    @staticmethod
+    def __iter_marked_lines(text: str, marker: str, reverse: bool = False):
+        """
+        逐个定位包含标记的行，不拆分整个日志文本，reverse 为真时从文本末尾往前查找
+        """
+        pos = text.rfind(marker) if reverse else text.find(marker)
+        while pos != -1:
+            start = text.rfind("\n", 0, pos) + 1
+            end = text.find("\n", pos)
+            if end == -1:
+                end = len(text)
+            yield text[start:end].rstrip("\r")
+            pos = text.rfind(marker, 0, start) if reverse else text.find(marker, end)
+
+    @staticmethod
+    def __parse_emby_remove_line(line: str) -> Optional[Tuple[str, ...]]:
+        """
+        解析Emby删除日志行，返回 (时间, 类型, 名称, 路径, ID)，格式不符时回退到正则
+        """
+        head, _, rest = line.partition(_EMBY_REMOVE_MARKER)
+        mtime = head.rstrip()
+        mtype, _, rest = rest.partition(", Name: ")
+        rest, _, item_id = rest.rpartition(", Id: ")
+        name, _, path = rest.rpartition(", Path: ")
+        if len(mtime) == 23 and mtime[:4].isdigit() and mtype.isalnum() and item_id.isdigit() and path:
+            return mtime, mtype, name, path, item_id
+        match = _EMBY_REMOVE_RE.search(line)
+        return match.groups() if match else None
 
     @staticmethod
     def get_tmdbimage_url(path: str, prefix="w500"):
@@ -472,10 +1184,32 @@ class MediaSyncDel(_PluginBase):
 
     @staticmethod
     def format_timestamp(json_data: dict) -> str:
-        from app.utils.string import StringUtils
         return StringUtils.format_timestamp(StringUtils.str_to_timestamp(json_data.get("UtcTimestamp") or json_data.get("Date")))
 
     def stop_service(self):
-        try:
-            if self._scheduler: self._scheduler.shutdown()
-        except: pass
+        if self._webhook_timer:
+            # 立即处理尚在合并窗口内的删除事件
+            self._webhook_timer.cancel()
+            self.__flush_webhook()
+        # 写回尚未保存的历史记录
+        self.__flush_history()
+        if self._scheduler:
+            try:
+                self._scheduler.remove_all_jobs()
+                if self._scheduler.running:
+                    self._scheduler.shutdown()
+            except SchedulerNotRunningError as e:
+                logger.debug(f"定时服务已停止：{str(e)}")
+            self._scheduler = None
+        if self._io_pool:
+            self._io_pool.shutdown(wait=False)
+            self._io_pool = None
+        if self._notify_timer:
+            # 立即发送尚在合并窗口内的通知
+            self._notify_timer.cancel()
+            self.__flush_notify()
+        if self._torrent_queue:
+            # 通知后台线程处理完积压任务后退出
+            self._torrent_queue.put(None)
+            self._torrent_queue = None
+            self._torrent_worker = None